@@ -1,16 +1,18 @@
+import os
 import re
-import sys
-import time
-import tempfile
+import mmap
 import logging
-import subprocess
-from queue import Empty
+from itertools import groupby
 import multiprocessing as mp
 
 import pyfaidx
 import click
 import h5py
 import numpy as np
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
 
 from dlo_hic.utils import reverse_complement as rc
 from dlo_hic.utils.parse_text import parse_rest
@@ -19,71 +21,220 @@ from dlo_hic.utils.wrap.tabix import sort_bed6, index_bed6
 
 log = logging.getLogger(__name__)
 
+TILE_SIZE = 8 << 20  # chromosomes are split to 8Mb tiles for parallel scanning
 
-def worker(task_queue, output_queue, rest, fasta):
+# IUPAC ambiguity codes of restriction site
+IUPAC_CODES = {
+    'N': '[ACGT]', 'R': '[AG]', 'Y': '[CT]', 'S': '[CG]', 'W': '[AT]', 'K': '[GT]',
+    'M': '[AC]', 'B': '[CGT]', 'D': '[AGT]', 'H': '[ACT]', 'V': '[ACG]',
+}
+
+
+def rest_regex(rest_seq):
+    """ convert restriction site sequence to case sensitive(upper case) regex pattern,
+    IUPAC ambiguity codes are expanded to character classes. """
+    return "".join(IUPAC_CODES.get(b, re.escape(b)) for b in rest_seq.upper())
+
+
+class SiteScanner(object):
+    """
+    Find the restriction sites on both strands of a sequence.
+
+    Use Hyperscan(if installed) to find the sites of both strands in one pass,
+    otherwise fall back to the `re` module.
+    All sites are reported, include the overlapped ones of self-overlapping
+    restriction site(for example, HhaI: GCGCGC contains two GCGC sites),
+    so the result is independent of how the chromosome is split to tiles.
+
+    Parameters
+    ----------
+    rest_seq : str
+        Restriction site sequence, IUPAC ambiguity codes are supported.
+    cutting_idx : int
+        Cutting position within the restriction site.
+    """
+    def __init__(self, rest_seq, cutting_idx):
+        self.cutting_idx = cutting_idx
+        rest_seq = rest_seq.upper()
+        rest_seq_rc = rc(rest_seq)
+        self.patterns = [rest_regex(rest_seq).encode()]
+        if rest_seq_rc != rest_seq:
+            self.patterns.append(rest_regex(rest_seq_rc).encode())
+
+        if hyperscan is not None:
+            flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST
+            self.db = hyperscan.Database()
+            self.db.compile(expressions=self.patterns,
+                            ids=list(range(len(self.patterns))),
+                            elements=len(self.patterns),
+                            flags=[flags] * len(self.patterns))
+        else:
+            self.db = None
+            # lookahead for find the overlapped sites
+            self.regexes = [re.compile(b"(?=" + p + b")") for p in self.patterns]
+
+    def scan(self, seq):
+        """
+        Parameters
+        ----------
+        seq : bytes
+            The sequence to be scanned.
+
+        Return
+        ------
+        sites : list of `numpy.ndarray`
+            Fragment start positions on each strand, forward strand first.
+            Only forward strand is returned when the restriction site is palindromic.
+        """
+        if self.db is not None:
+            hits = self.__scan_hyperscan(seq)
+        else:
+            seq = seq.upper()
+            hits = [(m.start() for m in regex.finditer(seq)) for regex in self.regexes]
+        return [np.fromiter(h, dtype=np.int64) + self.cutting_idx for h in hits]
+
+    def __scan_hyperscan(self, seq):
+        hits = [[] for _ in self.patterns]
+
+        def on_match(id_, start, end, flags, context):
+            hits[id_].append(start)
+
+        self.db.scan(seq, match_event_handler=on_match)
+        return hits
+
+
+def split_tiles(chr_len, tile_size=TILE_SIZE):
+    """ split a chromosome to tiles, yield (start, end) of each tile. """
+    for start in range(0, max(chr_len, 1), tile_size):
+        yield start, min(start + tile_size, chr_len)
+
+
+def read_region(mm, fai_record, start, end):
+    """ read region [start, end) of a chromosome from the mmaped fasta file,
+    locate it by the chromosome's .fai index record.
+    return bytes without line breaks. """
+    end = min(end, fai_record.rlen)
+    if fai_record.rlen == 0 or start >= end:  # record without sequence
+        return b""
+    offset, lenc, lenb = fai_record.offset, fai_record.lenc, fai_record.lenb
+    b_start = offset + (start // lenc) * lenb + start % lenc
+    b_end = offset + (end // lenc) * lenb + end % lenc
+    return mm[b_start:b_end].translate(None, b'\r\n')
+
+
+def bed6_template(chr_, strand):
+    """ BED6 line template of fragments: [chr, start, end, name, score, strand] """
+    chr_ = chr_.encode().replace(b"%", b"%%")  # '%' is allowed in sequence names
+    return b"%s\t%%d\t%%d\t.\t0\t%s\n" % (chr_, strand.encode())
+
+
+def format_fragments(chr_, strand, sites):
+    """ format fragments between adjacent sites to BED6 lines, return bytes. """
+    tmpl = bed6_template(chr_, strand)
+    sites = sites.tolist()
+    return b"".join([tmpl % (start, end) for start, end in zip(sites[:-1], sites[1:])])
+
+
+# states of worker process, set by `init_worker`
+_worker = {}
+
+
+def init_worker(rest, fasta, fai_index, out_fmt):
+    """
+    Initialize the worker process.
+
+    Parameters
+    ----------
+    fai_index : dict
+        .fai index records of all chromosomes, loaded by the main process.
+    """
     cutting_idx, rest_seq = parse_rest(rest)
-    rest_seq_rc = rc(rest_seq)
-    faidx = pyfaidx.Fasta(fasta)
-
-    while 1:
-        chr_ = task_queue.get()
-        if chr_ is None:
-            log.debug("Process-%d done"%mp.current_process().pid)
-            break
-
-        seq = faidx[chr_][:].seq # read sequence
-        seq_len = len(seq)
-
-        out_chunk = [0] 
-        for match in re.finditer(rest_seq, seq, re.IGNORECASE):
-            out_chunk.append(
-                match.start() + cutting_idx  # fragment start
-            )
-
-        out_chunk.append(seq_len)
-        output_queue.put( (chr_, '+', out_chunk) )
-
-        if rest_seq_rc != rest_seq: # find reverse complement restriction site
-            out_chunk = []
-            for match in re.finditer(rest_seq_rc, seq, re.IGNORECASE):
-                out_chunk.append(
-                    match.start() + cutting_idx
-                )
-            output_queue.put( (chr_, '-', out_chunk) )
-
-
-def outputer(output, out_fmt, rest, output_queue):
-    """ output extracted results """
-    if out_fmt == 'tab':
-        with open(output, 'w') as f:
-            f.write("# rest_seq: "+rest+"\n")
-            while 1:
-                out_tupl = output_queue.get()
-                if out_tupl is None:
-                    log.debug("Process-output done.")
-                    f.flush()
+    _worker['cutting_idx'] = cutting_idx
+    _worker['scanner'] = SiteScanner(rest_seq, cutting_idx)
+    _worker['overlap'] = len(rest_seq) - 1
+    _worker['fai_index'] = fai_index
+    _worker['out_fmt'] = out_fmt
+    if fasta.endswith(".gz"):  # bgzip compressed fasta can not be mmaped
+        _worker['faidx'] = pyfaidx.Faidx(fasta)
+        _worker['mm'] = None
+    else:
+        with open(fasta, 'rb') as f:
+            _worker['mm'] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def scan_tile(task):
+    """ find all restriction sites within a tile, return them as one batch.
+
+    For 'tab' output format, fragments within the tile are formatted to
+    BED6 lines in the worker, batch of each strand is (first site, last site, lines),
+    or None if there are no site. Otherwise, batch is the sites array.
+    """
+    chr_, start, end = task
+    cutting_idx, overlap, mm = _worker['cutting_idx'], _worker['overlap'], _worker['mm']
+    # extend tile with overlap, for find the sites across the tile boundary
+    if mm is not None:
+        seq = read_region(mm, _worker['fai_index'][chr_], start, end+overlap)
+    else:
+        seq = _worker['faidx'].fetch(chr_, start+1, end+overlap).seq.encode()
+
+    batches = []
+    for strand, s in zip('+-', _worker['scanner'].scan(seq)):
+        s = s[s - cutting_idx < end - start]  # sites start in overlap belong to next tile
+        s += start
+        if _worker['out_fmt'] != 'tab':
+            batches.append(s)
+        elif len(s) == 0:
+            batches.append(None)
+        else:
+            batches.append( (int(s[0]), int(s[-1]), format_fragments(chr_, strand, s)) )
+    return chr_, batches
+
+
+def outputer(output, out_fmt, rest, chr_lens, results):
+    """ output extracted results
+
+    Parameters
+    ----------
+    chr_lens : dict
+        length of each chromosome.
+    results : iterable
+        scan results of tiles, in the order of chromosome and position.
+    """
+    def fetch_chromosomes():
+        """ group tiles results by chromosome, yield (chr_, strand, batches of tiles) """
+        for chr_, tiles in groupby(results, key=lambda r: r[0]):
+            chr_batches = [batches for _, batches in tiles]
+            for strand_idx, strand in enumerate('+-'):
+                if strand_idx >= len(chr_batches[0]):
                     break
-                chr_, strand, out_chunk = out_tupl
-                for idx_s in range(len(out_chunk)-1):
-                    # BED6: [chr, start, end, name, score, strand]
-                    start = out_chunk[idx_s]
-                    end = out_chunk[idx_s+1]
-                    out_itms = [chr_, str(start), str(end), ".", "0", strand]
-                    out_line = "\t".join(out_itms) + "\n"
-                    f.write(out_line)
+                yield chr_, strand, [t[strand_idx] for t in chr_batches]
+
+    if out_fmt == 'tab':
+        with open(output, 'wb') as f:
+            f.write(b"# rest_seq: " + rest.encode() + b"\n")
+            for chr_, strand, batches in fetch_chromosomes():
+                tmpl = bed6_template(chr_, strand)
+                # fragments across tiles boundary
+                prev = 0 if strand == '+' else None
+                for batch in batches:
+                    if batch is None:
+                        continue
+                    first, last, lines = batch
+                    if prev is not None:
+                        f.write(tmpl % (prev, first))
+                    f.write(lines)
+                    prev = last
+                if strand == '+':
+                    f.write(tmpl % (prev, chr_lens[chr_]))
     elif out_fmt == 'hdf5':
         output = output + '.hdf5' if not output.endswith('.hdf5') else output
         with h5py.File(output, 'w') as f:
             f.create_group("chromosomes")
             f.attrs['rest_seq'] = rest
-            while 1:
-                out_tupl = output_queue.get()
-                if out_tupl is None:
-                    log.debug("Process-output done.")
-                    f.flush()
-                    break
-                chr_, _, out_chunk = out_tupl
-                f.create_dataset("chromosomes/"+chr_, data=np.array(out_chunk, dtype=np.int))
+            for chr_, strand, batches in fetch_chromosomes():
+                if strand == '+':
+                    out_chunk = np.concatenate([[0]] + batches + [[chr_lens[chr_]]]).astype(np.int64)
+                    f.create_dataset("chromosomes/"+chr_, data=out_chunk)
     else:
         raise NotImplementedError("output format only support tab and hdf5.")
 
@@ -92,7 +243,7 @@ def outputer(output, out_fmt, rest, output_queue):
 @click.argument("fasta", nargs=1)
 @click.option("--rest-seq", "-r", "rest", required=True,
     help="The sequence of restriction site, use '^' to indicate the cutting site,"
-         "for example, MseI: T^TAA")
+         "for example, MseI: T^TAA. IUPAC ambiguity codes are supported, for example, HinfI: G^ANTC")
 @click.argument("output", nargs=1)
 @click.option("--output-format", "-f",
     type=click.Choice(['hdf5', 'tab']),
@@ -109,49 +260,30 @@ def _main(fasta, rest, output, output_format, processes):
     if output.endswith(".gz"):
         output = output.replace(".gz", "")
 
-    faidx = pyfaidx.Fasta(fasta)
-    chrs = faidx.keys()
-
-    task_queue   = mp.Queue()
-    output_queue = mp.Queue(maxsize=processes)
-
-    processes = min(processes, len(chrs))
-
-    workers = [mp.Process(target=worker,
-                       args=(task_queue, output_queue, rest, fasta))
-               for i in range(processes)]
-
-    for chr_ in chrs:
-        task_queue.put(chr_)
-    for w in workers: # put end flag to task queue
-        task_queue.put(None)
-
-    output_p = mp.Process(target=outputer, args=(output, output_format, rest, output_queue))
-
-    # launch processes
-    for w in workers:
-        w.start()
-    output_p.start()
-
-    log.info("%d workers spawned for extract restriction sites"%len(workers))
-
-    # wait all tasks done
-    for w in workers:
-        w.join()
+    # load .fai index once, share it with all workers
+    with pyfaidx.Faidx(fasta) as faidx:
+        fai_index = faidx.index
+    chrs = list(fai_index.keys())
 
-    # put end flag to output queue
-    output_queue.put(None)
+    # split chromosomes to tiles, parallel within long chromosomes
+    chr_lens = {chr_: fai_index[chr_].rlen for chr_ in chrs}
+    tasks = [(chr_, start, end) for chr_ in chrs
+             for start, end in split_tiles(chr_lens[chr_], TILE_SIZE)]
 
-    output_p.join() # wait all result outputed
+    processes = min(processes, len(tasks))
+    log.info("%d workers spawned for extract restriction sites"%processes)
+    with mp.Pool(processes, initializer=init_worker, initargs=(rest, fasta, fai_index, output_format)) as pool:
+        # results are yielded in the order of tasks
+        results = pool.imap(scan_tile, tasks, chunksize=1)
+        outputer(output, output_format, rest, chr_lens, results)
 
     if output_format == 'tab':
-        # sort output bed file
+        # sort output bed file, and compress to bgzf at same time
         log.info("sorting bed file ...")
-        sort_bed6(output, output+'.sort')
-        subprocess.check_call(["mv", output+'.sort', output])
+        sort_bed6(output, output+'.gz')
         log.info("building tabidx...")
-        index_bed6(output)
-        subprocess.check_call(["rm", output])
+        index_bed6(output+'.gz')
+        os.remove(output)
         log.info("Result storaged in bgziped file %s"%(output+".gz"))
 
 main = _main.callback
@@ -0,0 +1,34 @@
+
+cpdef str bedpe_line_to_pairs(str line, bint use_start1=True, bint use_start2=True):
+    """
+    Convert a BEDPE line to Pairs line, in upper triangle form.
+    Same to `Bedpe.from_line(line).to_pairs_line()`,
+    but without create the intermediate record object.
+
+    about pairs format:
+    https://github.com/4dn-dcic/pairix/blob/master/pairs_format_specification.md
+    """
+    cdef list items = line.split()
+    cdef str chr1 = items[0], chr2 = items[3]
+    cdef long start1 = int(items[1]), start2 = int(items[4])
+    if (chr1 > chr2) or (chr1 == chr2 and start1 > start2):  # exchange two ends
+        return "\t".join([items[6],
+                          chr2, items[4] if use_start1 else items[5],
+                          chr1, items[1] if use_start2 else items[2],
+                          items[9], items[8]])
+    else:
+        return "\t".join([items[6],
+                          chr1, items[1] if use_start1 else items[2],
+                          chr2, items[4] if use_start2 else items[5],
+                          items[8], items[9]])
+
+
+def bedpe2pairs(line_iterator, str pos1='start', str pos2='start'):
+    """
+    Convert the line format from BEDPE to Pairs.
+    """
+    cdef bint use_start1 = pos1 == 'start'
+    cdef bint use_start2 = pos2 == 'start'
+    cdef str line
+    for line in line_iterator:
+        yield bedpe_line_to_pairs(line, use_start1, use_start2)
@@ -133,6 +133,9 @@ class Bedpe(object):
         self.start1,  self.start2  = self.start2, self.start1
         self.end1,    self.end2    = self.end2, self.end1
         self.strand1, self.strand2 = self.strand2, self.strand1
+        if self.extends:  # etags of two ends
+            self.extends[0:2], self.extends[2:4] = self.extends[2:4], self.extends[0:2]
+            self.etag1, self.etag2, self.etag3, self.etag4 = self.extends[:4]
 
     def to_upper_trangle(self):
         """
@@ -10,6 +10,10 @@ def get_base_map():
     base_map[ ord('g') ] = b'c'
     base_map[ ord('N') ] = b'N'
     base_map[ ord('n') ] = b'n'
+    # IUPAC ambiguity codes
+    for a, b in zip("RYKMBVDHSW", "YRMKVBHDSW"):
+        base_map[ ord(a) ] = b.encode()
+        base_map[ ord(a.lower()) ] = b.lower().encode()
     base_map = bytes(b''.join(base_map))
     return base_map
 
@@ -127,6 +127,13 @@ def bedpe2pairs(line_iterator, pos1='start', pos2='start'):
     """
     Convert the line format from BEDPE to Pairs.
     """
+    try:
+        from dlo_hic.utils.bedpe_convert import bedpe2pairs as fast_bedpe2pairs
+    except ImportError:  # extension not built, fall back to pure Python
+        fast_bedpe2pairs = None
+    if fast_bedpe2pairs is not None:
+        yield from fast_bedpe2pairs(line_iterator, pos1, pos2)
+        return
     from dlo_hic.utils.parse_text import Bedpe
     itr = line_iterator
     for line in itr:
@@ -146,13 +153,73 @@ def sort_pairs(pairs_path, ncpu=8):
         yield outline
 
 
-def sort_bedpe(bedpe_path, ncpu=8, by_etag=False):
-    """ sort bedpe file. """
+# awk script for transform BEDPE records to upper triangle form,
+# swap two ends(position, strand and etags) when chr1 > chr2,
+# or chr1 == chr2 and start1 > start2.
+UPPER_TRI_AWK = (
+    'BEGIN{OFS="\\t"} '
+    '{ if (($1"") > ($4"") || (($1"") == ($4"") && $2+0 > $5+0)) {'
+    ' t=$1; $1=$4; $4=t; t=$2; $2=$5; $5=t; t=$3; $3=$6; $6=t;'
+    ' t=$9; $9=$10; $10=t;'
+    ' if (NF >= 14) { t=$11; $11=$13; $13=t; t=$12; $12=$14; $14=t } }'
+    ' print }'
+)
+
+# awk script for decorate BEDPE records with a key field of the etag dedup,
+# record without etags(less than 14 fields) gets an unique key(line number),
+# so it will not be collapsed by `sort -u`.
+ETAG_DEDUP_AWK = 'BEGIN{OFS="\t"} { print (NF >= 14 ? "." : NR), $0 }'
+
+
+def sort_bedpe(bedpe_path, ncpu=8, by_etag=False, upper_tri=False, unique=False,
+               by_pairs_key=False):
+    """ sort bedpe file.
+
+    Arguments
+    ---------
+    by_etag : bool
+        Sort by the enzyme cutting site tags(extends fields), not the position.
+    upper_tri : bool
+        Transform records to upper triangle form before sort.
+    unique : bool
+        Output only the first record of the records have same sort key(`sort -u`).
+        If sort by etag, this is same to remove redundancy by etag,
+        records without etags are all kept.
+    by_pairs_key : bool
+        Sort in the order of the converted Pairs file(chr1, chr2, start1, start2, strand1, strand2),
+        so the Pairs lines converted from output need not sort again.
+        If set with `by_etag` and `unique`, records are unique by etag firstly,
+        then sorted by the Pairs key.
+    """
     import subprocess as subp
+    etag_keys = "-k1,1 -k4,4 -k11,11 -k13,13 -k9,9 -k10,10"
+    pairs_keys = "-k1,1 -k4,4 -k2,2n -k5,5n -k9,9 -k10,10"
     if by_etag:
-        cmd = "sort --parallel={} -k1,1 -k4,4 -k11,11 -k12,12 -k9,9 -k10,10 {}".format(ncpu, bedpe_path)
+        keys = etag_keys
+    elif by_pairs_key:
+        keys = pairs_keys
+    else:
+        keys = "-k1,1 -k4,4 -k2,2n -k5,5n -k3,3n -k6,6n -k9,9 -k10,10"
+    steps = []
+    if upper_tri:
+        steps.append("awk '{}'".format(UPPER_TRI_AWK))
+    if by_etag and unique:
+        # dedup by the key field and etags, remove the key field after sort
+        steps.append("awk '{}'".format(ETAG_DEDUP_AWK))
+        keys = "-k1,1 -k2,2 -k5,5 -k12,12 -k14,14 -k10,10 -k11,11"
+    opts = "--parallel={} {}".format(ncpu, keys)
+    if unique:
+        opts = "-u " + opts
+    steps.append("sort {}".format(opts))
+    if by_etag and unique:
+        steps.append("cut -f2-")
+    if by_etag and by_pairs_key:
+        steps.append("sort --parallel={} {}".format(ncpu, pairs_keys))
+    if bedpe_path.endswith(".gz"):
+        steps.insert(0, "gzip -dc {}".format(bedpe_path))
     else:
-        cmd = "sort --parallel={} -k1,1 -k4,4 -k2,2n -k5,5n -k3,3n -k6,6n -k9,9 -k10,10 {}".format(ncpu, bedpe_path)
+        steps[0] += " " + bedpe_path
+    cmd = " | ".join(steps)
     p = subp.Popen(cmd, shell=True, stdout=subp.PIPE)
     for line in p.stdout:
         line = line.decode('utf-8')
@@ -174,14 +174,19 @@ class StrawWrap(HiCWrap):
         binlen2 = (genome_range2.length // binsize) + 1
 
         mat = np.zeros((binlen1, binlen2), dtype=np.float64)
-        for loc1, loc2, c in zip(*straw_list):
-            bin1id = min((loc1 - genome_range1.start) // binsize, binlen1 - 1)
-            bin2id = min((loc2 - genome_range2.start) // binsize, binlen2 - 1)
-            if binlen1 == binlen2:
-                mat[bin1id, bin2id] = c
-                mat[bin2id, bin1id] = c
-            else:
-                mat[bin1id, bin2id] = c
+        # locate all records at once
+        locs1 = np.asarray(straw_list[0], dtype=np.int64)
+        locs2 = np.asarray(straw_list[1], dtype=np.int64)
+        counts = np.asarray(straw_list[2], dtype=np.float64)
+        bin1ids = np.minimum((locs1 - genome_range1.start) // binsize, binlen1 - 1)
+        bin2ids = np.minimum((locs2 - genome_range2.start) // binsize, binlen2 - 1)
+        if genome_range1 == genome_range2:
+            # fill the cell and its mirror record by record, the later record wins
+            rows = np.stack([bin1ids, bin2ids], axis=1).ravel()
+            cols = np.stack([bin2ids, bin1ids], axis=1).ravel()
+            mat[rows, cols] = np.repeat(counts, 2)
+        else:
+            mat[bin1ids, bin2ids] = counts
 
         #if flag:
         #    mat = mat.T
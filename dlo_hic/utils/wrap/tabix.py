@@ -1,39 +1,112 @@
+import os
+import re
 import subprocess
+from functools import lru_cache
 
-from dlo_hic.utils.parse_text import parse_line_bed6
+
+def version_key(chr_):
+    """ sort key of chromosome name, same as version sort(`sort -V`),
+    for example: chr1, chr2, ..., chr10, chrX """
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", chr_)]
 
 
 def sort_bed6(file_in, file_out):
-    """ sort bed file. """
-    cmd = "sort -k1,1V -k2,2n -k3,3n {} > {}".format(file_in, file_out)
-    subprocess.check_call(cmd, shell=True)
+    """ sort bed file by chromosome(version order), start and end.
+
+    Only the position and the byte offset of each record are loaded,
+    records are sorted with `numpy.lexsort` and copied from the mmaped input file.
+    if `file_out` ends with '.gz', the result will be written in bgzf format
+    directly, which can be indexed without re-compress.
+    """
+    import mmap
+    from array import array
+    import numpy as np
+    import pysam
+
+    headers = []
+    chr_ids = {}
+    chrs, starts, ends, offsets = array('i'), array('q'), array('q'), array('q')
+    with open(file_in, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.startswith(b"#"):
+                headers.append(line.rstrip(b"\n") + b"\n")
+            else:
+                chr_, start, end = line.split(b"\t", 3)[:3]
+                chrs.append(chr_ids.setdefault(chr_, len(chr_ids)))
+                starts.append(int(start))
+                ends.append(int(end))
+                offsets.append(offset)
+            offset += len(line)
+
+    # rank of chromosomes in version order
+    chr_names = sorted(chr_ids, key=lambda c: version_key(c.decode()))
+    ranks = np.empty(len(chr_ids), dtype=np.int32)
+    ranks[[chr_ids[c] for c in chr_names]] = np.arange(len(chr_names))
+    # stable, order by chromosome, start then end
+    order = np.lexsort((np.frombuffer(ends, dtype=np.int64),
+                        np.frombuffer(starts, dtype=np.int64),
+                        ranks[np.frombuffer(chrs, dtype=np.int32)]))
+    del chrs, starts, ends
+    offsets = np.frombuffer(offsets, dtype=np.int64)[order]
+
+    out = pysam.BGZFile(file_out, 'wb') if file_out.endswith(".gz") else open(file_out, 'wb')
+    with out, open(file_in, 'rb') as f:
+        out.write(b"".join(headers))
+        if len(offsets) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            batch_size = 1 << 16
+            for i in range(0, len(offsets), batch_size):
+                lines = []
+                for offset in offsets[i:i+batch_size].tolist():
+                    end = mm.find(b"\n", offset)
+                    lines.append(mm[offset:end if end != -1 else len(mm)])
+                lines.append(b"")  # ensure every line ends with '\n'
+                out.write(b"\n".join(lines))
 
 
 def index_bed6(bedfile):
     """ build tabix index for bedfile.
-    please ensure bed file is sorted """
-    cmd = "cat {} | bgzip > {}".format(bedfile, bedfile+'.gz')
-    subprocess.check_call(cmd, shell=True)
-    cmd = "tabix -s 1 -b 2 -e 3 {}".format(bedfile+'.gz')
-    subprocess.check_call(cmd, shell=True)
+    please ensure bed file is sorted.
+    If bedfile is not bgzip compressed, it will be compressed to bedfile+'.gz'. """
+    import pysam
+    pysam.tabix_index(bedfile, preset='bed', force=True, keep_original=True)
+
+
+@lru_cache(maxsize=16)
+def _open_tabix(path, stamp):
+    import pysam
+    return pysam.TabixFile(path)
+
+
+def open_tabix(path):
+    """ open tabix indexed file, keep opened files for reuse.
+    The file is reopened when it or its index is rebuilt. """
+    stamp = tuple((st.st_mtime_ns, st.st_size)
+                  for st in (os.stat(path), os.stat(path+'.tbi')))
+    return _open_tabix(path, stamp)
 
 
 def query_bed6(bedfile, chr_, start=None, end=None):
-    """ query to indexed bed file """
-    start, end = str(start), str(end)
-    if start and end:
-        cmd = "tabix {} {}:{}-{}".format(bedfile+'.gz', chr_, start, end)
+    """ query to indexed bed file,
+    yield (chr, start, end, name, score, strand) """
+    import pysam
+    tbx = open_tabix(bedfile+'.gz')
+    if chr_ not in tbx.contigs:  # no records in this chromosome
+        return
+    if start is not None and end is not None:
+        start, end = int(start), int(end)
     else:
-        cmd = "tabix {} {}".format(bedfile+'.gz', chr_)
-    process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE)
-    for line in process.stdout:
-        line = line.decode("utf-8")  # note: subprocess stdout is bytes stream
-        yield parse_line_bed6(line)
+        start = end = None
+    for rec in tbx.fetch(chr_, start, end, parser=pysam.asBed()):
+        yield rec.contig, rec.start, rec.end, rec.name, int(rec.score), rec.strand
 
 
-def index_pairs(pairs_file):
-    """ build index for pairs file. """
-    cmd = "grep -v '#' {} | bgzip > {}".format(pairs_file, pairs_file+".gz")
+def index_pairs(pairs_file, ncpu=1):
+    """ build index for pairs file.
+    use `ncpu` threads for bgzip compression. """
+    cmd = "grep -v '#' {} | bgzip -@ {} > {}".format(pairs_file, ncpu, pairs_file+".gz")
     subprocess.check_call(cmd, shell=True)
     cmd = "pairix -f {}".format(pairs_file+".gz")
     subprocess.check_call(cmd, shell=True)
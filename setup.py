@@ -16,6 +16,7 @@ extensions = [
     Extension('dlo_hic.utils.align',       sources=['dlo_hic/utils/align.pyx']),
     Extension('dlo_hic.utils.fastqio',     sources=['dlo_hic/utils/fastqio.pyx']),
     Extension('dlo_hic.utils.linker_trim', sources=['dlo_hic/utils/linker_trim.pyx']),
+    Extension('dlo_hic.utils.bedpe_convert', sources=['dlo_hic/utils/bedpe_convert.pyx']),
 ]
 
 
@@ -0,0 +1,121 @@
+import os
+import re
+
+import h5py
+import numpy as np
+
+from dlo_hic.tools.helper.extract_fragments import main as extract_fragments
+
+
+seqs = {
+    "chr1": "ACGTTAAGGCttaaCCGATTAACGTACGTAGGCCTTAAttAAGATTACAGATTAA",
+    "chr2": "GGGCCCAAATTTGGGCCCAAATTT",
+    "chr5": "",  # record without sequence
+    "chr3": "TTAAGGGTTAACCCTTAA" * 5,
+    "chr4": "AATCGGAATCGATTAATCCCttaa" * 3,
+    "chr6": "AAGCAGCAGCAAGCGCGCGCTTAATTAA",  # self-overlapping sites
+    "scaf%1": "GATTAATCGGATTC",  # '%' is allowed in sequence names
+}
+
+
+def create_example_fasta(fa="/tmp/example.fa", width=10):
+    with open(fa, 'w') as f:
+        for chr_, seq in seqs.items():
+            f.write(">" + chr_ + "\n")
+            for i in range(0, len(seq), width):
+                f.write(seq[i:i+width] + "\n")
+    return fa
+
+
+def expect_fragments(seq, rest_seq="TTAA", cutting_idx=1):
+    if isinstance(seq, bytes):
+        seq = seq.decode()
+    # lookahead for find the overlapped sites
+    sites = [m.start() + cutting_idx for m in re.finditer("(?=%s)"%rest_seq, seq.upper())]
+    return [0] + sites + [len(seq)]
+
+
+def test_extract_fragments_hdf5(monkeypatch):
+    from dlo_hic.tools.helper import extract_fragments as ef
+    fa = create_example_fasta()
+    output = "/tmp/example.rest.hdf5"
+    for rest, rest_seq, cutting_idx in [("T^TAA", "TTAA", 1), ("GC^NGC", "GC[ACGT]GC", 2)]:
+        # small tiles for test sites across tile boundary
+        for tile_size in (ef.TILE_SIZE, 7, 5):
+            monkeypatch.setattr(ef, "TILE_SIZE", tile_size)
+            extract_fragments(fa, rest, output, "hdf5", 2)
+            with h5py.File(output, 'r') as f:
+                assert f.attrs['rest_seq'] == rest
+                assert set(f["chromosomes"].keys()) == set(seqs.keys())
+                for chr_, seq in seqs.items():
+                    frags = f["chromosomes/" + chr_][()]
+                    assert np.array_equal(frags, expect_fragments(seq, rest_seq, cutting_idx))
+    for path in (fa, fa + ".fai", output):
+        os.remove(path)
+
+
+def test_SiteScanner(monkeypatch):
+    from dlo_hic.tools.helper import extract_fragments as ef
+    seq = seqs["chr1"].encode()
+    backends = [ef.hyperscan, None] if ef.hyperscan else [None]
+    for backend in backends:
+        monkeypatch.setattr(ef, "hyperscan", backend)
+        scanner = ef.SiteScanner("TTAA", 1)
+        sites = scanner.scan(seq)
+        assert len(sites) == 1
+        assert list(sites[0]) == expect_fragments(seq)[1:-1]
+
+        scanner = ef.SiteScanner("GATT", 2)
+        fwd, rev = scanner.scan(seq)
+        assert list(fwd) == expect_fragments(seq, "GATT", 2)[1:-1]
+        assert list(rev) == expect_fragments(seq, "AATC", 2)[1:-1]
+
+
+def test_extract_fragments_tab(monkeypatch):
+    import gzip
+    from dlo_hic.tools.helper import extract_fragments as ef
+    fa = create_example_fasta()
+    output = "/tmp/example.rest.bed"
+    expect = []
+    for chr_ in sorted(seqs):
+        seq = seqs[chr_]
+        sites = expect_fragments(seq, "GATT", 2)
+        frags = [(f, '+') for f in zip(sites[:-1], sites[1:])]
+        sites_rc = expect_fragments(seq, "AATC", 2)[1:-1]
+        frags += [(f, '-') for f in zip(sites_rc[:-1], sites_rc[1:])]
+        frags.sort(key=lambda t: t[0])
+        expect += ["%s\t%d\t%d\t.\t0\t%s"%(chr_, s, e, strand) for (s, e), strand in frags]
+    for tile_size in (ef.TILE_SIZE, 7):  # small tiles for test fragments across tile boundary
+        monkeypatch.setattr(ef, "TILE_SIZE", tile_size)
+        extract_fragments(fa, "GA^TT", output, "tab", 2)
+        assert not os.path.exists(output)
+        assert os.path.exists(output + ".gz.tbi")
+        with gzip.open(output + ".gz", 'rt') as f:
+            lines = [line.rstrip("\n") for line in f]
+        assert lines[0] == "# rest_seq: GA^TT"
+        assert lines[1:] == expect
+    for path in (fa, fa + ".fai", output + ".gz", output + ".gz.tbi"):
+        os.remove(path)
+
+
+def test_SiteScanner_iupac(monkeypatch):
+    from dlo_hic.tools.helper import extract_fragments as ef
+    seq = seqs["chr4"].encode()
+    backends = [ef.hyperscan, None] if ef.hyperscan else [None]
+    for backend in backends:
+        monkeypatch.setattr(ef, "hyperscan", backend)
+        scanner = ef.SiteScanner("GANTC", 1)  # HinfI, palindromic
+        sites = scanner.scan(seq)
+        assert len(sites) == 1
+        assert list(sites[0]) == expect_fragments(seq, "GA[ACGT]TC", 1)[1:-1]
+
+        scanner = ef.SiteScanner("AATY", 0)
+        fwd, rev = scanner.scan(seq)
+        assert list(fwd) == expect_fragments(seq, "AAT[CT]", 0)[1:-1]
+        assert list(rev) == expect_fragments(seq, "[AG]ATT", 0)[1:-1]
+        assert len(fwd) > 0 and len(rev) > 0
+
+        scanner = ef.SiteScanner("GCNGC", 2)  # Fnu4HI, self-overlapping
+        sites = scanner.scan(b"AAGCAGCAGCAA")
+        assert len(sites) == 1
+        assert list(sites[0]) == [4, 7]
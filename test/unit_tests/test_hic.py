@@ -0,0 +1,41 @@
+import numpy as np
+
+from dlo_hic.utils.wrap.hic import StrawWrap, GenomeRange
+
+
+def list_to_matrix(straw_list, genome_range1, genome_range2, binsize):
+    """ fill the matrix record by record """
+    binlen1 = (genome_range1.length // binsize) + 1
+    binlen2 = (genome_range2.length // binsize) + 1
+    mat = np.zeros((binlen1, binlen2))
+    for loc1, loc2, c in zip(*straw_list):
+        bin1id = min((loc1 - genome_range1.start) // binsize, binlen1 - 1)
+        bin2id = min((loc2 - genome_range2.start) // binsize, binlen2 - 1)
+        mat[bin1id, bin2id] = c
+        if genome_range1 == genome_range2:
+            mat[bin2id, bin1id] = c
+    return mat
+
+
+def test_list_to_matrix():
+    list_to_matrix_ = StrawWrap._StrawWrap__list_to_matrix
+    rs = np.random.RandomState(0)
+    binsize = 100
+    regions = [
+        ("chr1:0-1000", "chr1:0-1000"),
+        ("chr1:0-1000", "chr2:0-1000"),  # different regions with same bin number
+        ("chr1:0-1000", "chr1:2000-3000"),
+        ("chr1:0-1000", "chr2:500-2000"),
+    ]
+    for r1, r2 in regions:
+        r1, r2 = GenomeRange(r1), GenomeRange(r2)
+        for _ in range(20):
+            n = 50
+            locs1 = rs.randint(r1.start, r1.end + 1, n).tolist()
+            locs2 = rs.randint(r2.start, r2.end + 1, n).tolist()
+            counts = rs.randint(1, 100, n).astype(float).tolist()
+            straw_list = [locs1, locs2, counts]
+            expect = list_to_matrix(straw_list, r1, r2, binsize)
+            mat = list_to_matrix_(None, straw_list, r1, r2, binsize)
+            assert mat.dtype == np.float64  # same to CoolerWrap
+            assert np.array_equal(mat, expect)
@@ -0,0 +1,100 @@
+import os
+import random
+
+from dlo_hic.utils.parse_text import Bedpe
+from dlo_hic.utils.stream import sort_bedpe, sort_pairs, bedpe2pairs, write_to_file
+
+
+bedpe_lines = [
+    # chr1 start1 end1 chr2 start2 end2 name score strand1 strand2 etags
+    "chr1\t100\t120\tchr1\t500\t520\tr1\t0\t+\t-\t90-130\ts\t480-530\te",
+    "chr1\t502\t522\tchr1\t101\t121\tr2\t0\t-\t+\t480-530\ts\t90-130\te",  # rep of r1
+    "chr1\t103\t123\tchr1\t505\t525\tr3\t0\t+\t-\t90-130\ts\t480-530\ts",  # rep of r1
+    "chr1\t100\t120\tchr1\t500\t520\tr4\t0\t+\t+\t90-130\ts\t480-530\te",
+    "chr2\t100\t120\tchr1\t500\t520\tr5\t0\t+\t-\t90-130\ts\t480-530\te",
+    "chr1\t500\t520\tchr2\t100\t120\tr6\t0\t-\t+\t480-530\ts\t90-130\te",  # rep of r5
+    "chr10\t100\t120\tchr9\t900\t920\tr7\t0\t+\t-\t90-130\ts\t880-930\ts",
+]
+
+
+def create_example_bedpe(path="/tmp/example.bedpe"):
+    with open(path, 'w') as f:
+        for line in bedpe_lines:
+            f.write(line + "\n")
+    return path
+
+
+def test_sort_bedpe_unique_by_etag():
+    bedpe = create_example_bedpe()
+    lines = list(sort_bedpe(bedpe, ncpu=1, by_etag=True, upper_tri=True, unique=True))
+    names = sorted(Bedpe.from_line(l).name for l in lines)
+    assert len(names) == 4
+    assert "r4" in names and "r7" in names
+    for line in lines:
+        b = Bedpe.from_line(line)
+        assert (b.chr1 < b.chr2) or (b.chr1 == b.chr2 and b.start1 <= b.start2)
+        # same as Bedpe's upper triangle transform
+        o = Bedpe.from_line(bedpe_lines[int(b.name[1:]) - 1])
+        o.to_upper_trangle()
+        assert str(o) == line
+    os.remove(bedpe)
+
+
+def test_bedpe_line_to_pairs():
+    from dlo_hic.utils.bedpe_convert import bedpe_line_to_pairs
+    for line in bedpe_lines:
+        for pos1 in ('start', 'end'):
+            for pos2 in ('start', 'end'):
+                expect = Bedpe.from_line(line).to_pairs_line(pos1, pos2)
+                res = bedpe_line_to_pairs(line, pos1 == 'start', pos2 == 'start')
+                assert res == expect
+
+
+def test_sort_bedpe_unique_by_etag_without_etags():
+    # records without etags are not redundancy of each other
+    lines_no_etag = [
+        "chr1\t100\t120\tchr1\t500\t520\tn1\t0\t+\t-",
+        "chr1\t9000\t9020\tchr1\t50000\t50020\tn2\t0\t+\t-",
+        "chr1\t100\t120\tchr2\t500\t520\tn3\t0\t+\t-",
+        "chr2\t800\t820\tchr1\t300\t320\tn4\t0\t-\t+",
+    ]
+    bedpe = "/tmp/example.no_etag.bedpe"
+    with open(bedpe, 'w') as f:
+        for line in bedpe_lines + lines_no_etag:
+            f.write(line + "\n")
+    for by_pairs_key in (False, True):
+        lines = list(sort_bedpe(bedpe, ncpu=1, by_etag=True, upper_tri=True,
+                                unique=True, by_pairs_key=by_pairs_key))
+        names = sorted(Bedpe.from_line(l).name for l in lines)
+        assert names == ["n1", "n2", "n3", "n4", "r1", "r4", "r5", "r7"]
+    os.remove(bedpe)
+
+
+def test_sort_bedpe_by_pairs_key():
+    # converted Pairs lines are in the order of `sort_pairs` already
+    rs = random.Random(0)
+    chroms = ["chr1", "chr2", "chr10", "chrX"]
+    bedpe = "/tmp/example.random.bedpe"
+    with open(bedpe, 'w') as f:
+        for i in range(3000):
+            items = []
+            for _ in range(2):
+                start = rs.randrange(0, 10000, 10)
+                items.append((rs.choice(chroms), start, start + 20))
+            (c1, s1, e1), (c2, s2, e2) = items
+            line = "%s\t%d\t%d\t%s\t%d\t%d\tr%d\t0\t%s\t%s"%(
+                c1, s1, e1, c2, s2, e2, i, rs.choice("+-"), rs.choice("+-"))
+            if rs.random() < 0.8:  # with etags
+                line += "\t%d-%d\ts\t%d-%d\te"%(s1//500, s1//500+1, s2//500, s2//500+1)
+            f.write(line + "\n")
+    pairs = "/tmp/example.random.pairs"
+    key = lambda items: (items[1], items[3], int(items[2]), int(items[4]))
+    for dedup in (False, True):
+        lines = sort_bedpe(bedpe, ncpu=1, upper_tri=True, by_pairs_key=True,
+                           by_etag=dedup, unique=dedup)
+        write_to_file(bedpe2pairs(lines), pairs)
+        with open(pairs) as f:
+            keys = [key(line.split()) for line in f]
+        assert keys == [key(line.split()) for line in sort_pairs(pairs, ncpu=1)]
+    for path in (bedpe, pairs):
+        os.remove(path)
@@ -0,0 +1,46 @@
+import os
+
+from dlo_hic.utils.wrap.tabix import sort_bed6, index_bed6, query_bed6
+
+
+def create_example_bed(records, bed="/tmp/example.bed"):
+    with open(bed, 'w') as f:
+        for rec in records:
+            f.write("%s\t%d\t%d\t.\t0\t%s\n"%rec)
+    sort_bed6(bed, bed+".gz")
+    index_bed6(bed+".gz")
+    return bed
+
+
+def test_query_bed6():
+    records = [("chr2", 0, 10, '+'), ("chr1", 50, 80, '-'), ("chr1", 0, 50, '+')]
+    bed = create_example_bed(records)
+    assert list(query_bed6(bed, "chr1")) == [
+        ("chr1", 0, 50, ".", 0, "+"), ("chr1", 50, 80, ".", 0, "-")]
+    assert list(query_bed6(bed, "chr1", 60, 70)) == [("chr1", 50, 80, ".", 0, "-")]
+    assert list(query_bed6(bed, "chrX", 0, 100)) == []
+
+    # rebuild at the same path, query the new records
+    bed = create_example_bed([("chr1", 100, 200, '+'), ("chrX", 0, 10, '-')])
+    assert list(query_bed6(bed, "chr1")) == [("chr1", 100, 200, ".", 0, "+")]
+    assert list(query_bed6(bed, "chrX")) == [("chrX", 0, 10, ".", 0, "-")]
+    assert list(query_bed6(bed, "chr2")) == []
+    for path in (bed, bed + ".gz", bed + ".gz.tbi"):
+        os.remove(path)
+
+
+def test_sort_bed6():
+    bed = "/tmp/example.unsorted.bed"
+    with open(bed, 'w') as f:
+        f.write("# header\nchr10\t5\t9\ta\nchr2\t7\t8\tb\nchr2\t3\t9\tc\nchr2\t3\t4\td\nchr1\t0\t1\te")
+    sort_bed6(bed, bed + ".sorted")
+    with open(bed + ".sorted") as f:  # last line without '\n' is not joined to others
+        assert f.read() == "# header\nchr1\t0\t1\te\nchr2\t3\t4\td\nchr2\t3\t9\tc\nchr2\t7\t8\tb\nchr10\t5\t9\ta\n"
+
+    with open(bed, 'w') as f:
+        f.write("# header only\n")
+    sort_bed6(bed, bed + ".sorted")
+    with open(bed + ".sorted") as f:
+        assert f.read() == "# header only\n"
+    for path in (bed, bed + ".sorted"):
+        os.remove(path)